@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import User, Article, Comment, Category
+from .models import User, Article, Comment, Category, OutboxTask
+from .paginators import EstimatedCountPaginator
 
 
 @admin.register(User)
@@ -18,15 +19,31 @@ class CategoryAdmin(admin.ModelAdmin):
 @admin.register(Article)
 class ArticleAdmin(admin.ModelAdmin):
     list_display = ['title', 'author', 'category', 'created_at', 'updated_at']
-    list_filter = ['category', 'created_at']
+    list_filter = ['category']
+    list_select_related = ['author', 'category']
+    date_hierarchy = 'created_at'
     search_fields = ['title', 'content']
+    autocomplete_fields = ['author', 'category']
     readonly_fields = ['created_at', 'updated_at']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     list_display = ['article', 'author', 'created_at', 'updated_at']
-    list_filter = ['created_at']
+    list_select_related = ['article', 'author']
+    date_hierarchy = 'created_at'
     search_fields = ['content']
+    raw_id_fields = ['article']
+    autocomplete_fields = ['author']
     readonly_fields = ['created_at', 'updated_at']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
+
+@admin.register(OutboxTask)
+class OutboxTaskAdmin(admin.ModelAdmin):
+    list_display = ['name', 'status', 'attempts', 'run_at', 'created_at']
+    list_filter = ['status', 'name']
+    readonly_fields = ['created_at']
@@ -0,0 +1,117 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef
+from django.http import Http404
+from django.utils import timezone
+
+from .models import Article, Comment, ArchivedArticle, ArchivedComment
+
+
+def archive_cutoff(days=None):
+    return timezone.now() - timedelta(days=settings.ARCHIVE_AFTER_DAYS if days is None else days)
+
+
+def date_filters(created_after=None, created_before=None):
+    filters = {}
+    if created_after is not None:
+        filters['created_at__gte'] = created_after
+    if created_before is not None:
+        filters['created_at__lt'] = created_before
+    return filters
+
+
+def archive_boundary(model):
+    # Самая новая запись в архиве, а не ARCHIVE_AFTER_DAYS: archive можно
+    # запустить с другим --older-than-days. По индексу created_at это один шаг
+    return model.objects.aggregate(boundary=Max('created_at'))['boundary']
+
+
+def reaches_archive(model, created_after=None, created_before=None):
+    # Архив читается только по явному фильтру по дате, который захватывает
+    # хотя бы самую новую архивную запись
+    if created_after is None and created_before is None:
+        return False
+    boundary = archive_boundary(model)
+    if boundary is None:
+        return False
+    return created_after is None or created_after <= boundary
+
+
+def get_article_or_archived(article_id):
+    try:
+        return Article.objects.select_related('author', 'category').get(id=article_id)
+    except Article.DoesNotExist:
+        pass
+    try:
+        return ArchivedArticle.objects.select_related('author', 'category').get(id=article_id)
+    except ArchivedArticle.DoesNotExist:
+        raise Http404
+
+
+def get_comment_or_archived(comment_id):
+    try:
+        return Comment.objects.select_related('article', 'author').get(id=comment_id)
+    except Comment.DoesNotExist:
+        pass
+    comments = attach_articles(list(ArchivedComment.objects.select_related('author').filter(id=comment_id)))
+    if not comments:
+        raise Http404
+    return comments[0]
+
+
+def attach_articles(comments):
+    article_ids = {c.article_id for c in comments}
+    articles = Article.objects.in_bulk(article_ids)
+    missing = article_ids - articles.keys()
+    if missing:
+        articles.update(ArchivedArticle.objects.in_bulk(missing))
+    for comment in comments:
+        comment.article = articles.get(comment.article_id)
+    return [c for c in comments if c.article is not None]
+
+
+def archive_comments(cutoff, batch_size):
+    with transaction.atomic():
+        batch = list(
+            Comment.objects.select_for_update(skip_locked=True)
+            .filter(created_at__lt=cutoff).order_by('id')[:batch_size]
+        )
+        ArchivedComment.objects.bulk_create([
+            ArchivedComment(
+                id=c.id,
+                article_id=c.article_id,
+                author_id=c.author_id,
+                content=c.content,
+                created_at=c.created_at,
+                updated_at=c.updated_at,
+            ) for c in batch
+        ], ignore_conflicts=True)
+        Comment.objects.filter(id__in=[c.id for c in batch]).delete()
+    return len(batch)
+
+
+def archive_articles(cutoff, batch_size):
+    # Статья уходит в архив, только когда у нее не осталось горячих
+    # комментариев, иначе удаление каскадом заберет их с собой
+    has_comments = Comment.objects.filter(article=OuterRef('pk'))
+    with transaction.atomic():
+        batch = list(
+            Article.objects.select_for_update(skip_locked=True)
+            .filter(created_at__lt=cutoff).filter(~Exists(has_comments))
+            .order_by('id')[:batch_size]
+        )
+        ArchivedArticle.objects.bulk_create([
+            ArchivedArticle(
+                id=a.id,
+                title=a.title,
+                content=a.content,
+                author_id=a.author_id,
+                category_id=a.category_id,
+                created_at=a.created_at,
+                updated_at=a.updated_at,
+            ) for a in batch
+        ], ignore_conflicts=True)
+        Article.objects.filter(id__in=[a.id for a in batch]).delete()
+    return len(batch)
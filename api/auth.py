@@ -1,35 +1,65 @@
+from django.conf import settings
+from ninja.parser import Parser
+from ninja.security import HttpBearer
+from ninja.errors import Throttled
 from .models import User
+from .throttling import IPTokenBucketThrottle
+import json
 import logging
 
 logger = logging.getLogger('api')
 
 
-def get_user_from_token(request):
-    token = None
-    
-    if 'Authorization' in request.headers:
-        auth_header = request.headers['Authorization']
-        if auth_header.startswith('Bearer '):
-            token = auth_header.split('Bearer ')[1]
-        else:
-            token = auth_header
-    
-    if not token and hasattr(request, 'body'):
-        try:
-            import json
-            body = json.loads(request.body)
-            token = body.get('token')
-        except:
-            pass
-    
-    if not token:
-        logger.warning('Токен не найден в запросе')
-        return None
-    
-    try:
-        user = User.objects.get(token=token)
-        return user
-    except User.DoesNotExist:
-        logger.warning(f'Пользователь с токеном не найден')
+def parse_json_body(request):
+    # Тело разбирается один раз за запрос: результат переиспользует и
+    # TokenAuth, и парсер Ninja (JSONBodyParser)
+    if not hasattr(request, '_json_body'):
+        request._json_body = json.loads(request.body)
+    return request._json_body
+
+
+class JSONBodyParser(Parser):
+    def parse_body(self, request):
+        return parse_json_body(request)
+
+
+class TokenAuth(HttpBearer):
+    # IP-лимит записи берется до поиска токена: Ninja проверяет throttle
+    # после авторизации, и запросы с чужим токеном обходили бы лимит через 401
+    ip_throttle = IPTokenBucketThrottle('write', write_only=True)
+
+    def __call__(self, request):
+        if not self.ip_throttle.allow_request(request):
+            raise Throttled(self.ip_throttle.wait())
+        token = self.get_token(request)
+        if not token:
+            logger.warning('Токен не найден в запросе')
+            return None
+        return self.authenticate(request, token)
+
+    def get_token(self, request):
+        auth_header = request.headers.get(self.header)
+        if auth_header:
+            if auth_header.startswith('Bearer '):
+                return auth_header[len('Bearer '):]
+            return auth_header
+
+        if settings.AUTH_BODY_TOKEN_FALLBACK and request.body:
+            try:
+                body = parse_json_body(request)
+            except ValueError:
+                return None
+            if isinstance(body, dict):
+                return body.get('token')
+
         return None
 
+    def authenticate(self, request, token):
+        try:
+            return User.objects.get(token=token)
+        except User.DoesNotExist:
+            logger.warning('Пользователь с токеном не найден')
+            return None
+
+
+token_auth = TokenAuth()
@@ -0,0 +1,105 @@
+import gzip
+from importlib.util import find_spec
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+import logging
+
+from .throttling import count
+
+logger = logging.getLogger('api')
+
+_accept_encoding_re = _lazy_re_compile(r'\s*([\w*-]+)\s*(?:;\s*q=([0-9.]+))?\s*')
+
+
+def _gzip(content):
+    return gzip.compress(content, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def _brotli(content):
+    import brotli
+
+    return brotli.compress(content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+
+
+def _zstd(content):
+    import zstandard
+
+    return zstandard.ZstdCompressor(level=settings.COMPRESSION_ZSTD_LEVEL).compress(content)
+
+
+# brotli и zstandard импортируются при первом сжатии, а не при старте воркера
+COMPRESSORS = {'gzip': _gzip}
+if find_spec('brotli') is not None:
+    COMPRESSORS['br'] = _brotli
+if find_spec('zstandard') is not None:
+    COMPRESSORS['zstd'] = _zstd
+
+
+def parse_accept_encoding(header):
+    accepted = {}
+    for part in header.split(','):
+        match = _accept_encoding_re.fullmatch(part)
+        if not match:
+            continue
+        try:
+            quality = float(match.group(2) or 1)
+        except ValueError:
+            continue
+        accepted[match.group(1).lower()] = quality
+    return accepted
+
+
+def choose_encoding(header):
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get('*', 0)
+    best, best_quality = None, 0
+    for encoding in settings.COMPRESSION_ENCODINGS:
+        if encoding not in COMPRESSORS:
+            continue
+        quality = accepted.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CompressionMiddleware:
+    # Как django.middleware.gzip.GZipMiddleware, но с выбором br/zstd/gzip
+    # по Accept-Encoding и порогом COMPRESSION_MIN_SIZE. Потоковые ответы
+    # (SSE) не сжимаются, чтобы события не задерживались в буфере компрессора.
+    # Сжимается только /api/: HTML админки с CSRF-токеном в сжатом виде
+    # открыт для BREACH, а в ответах API CSRF-токена нет.
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not request.path.startswith('/api/'):
+            return response
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+
+        compressed = COMPRESSORS[encoding](response.content)
+        if len(compressed) >= len(response.content):
+            return response
+
+        count(f'compression.{encoding}')
+        count('compression.saved_bytes', len(response.content) - len(compressed))
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
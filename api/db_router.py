@@ -0,0 +1,64 @@
+import hashlib
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from ninja.throttling import BaseThrottle
+
+REPLICA_ALIAS = 'replica'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_enabled():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def _pin_keys(request):
+    # Запись пинит и токен, и IP: следующий GET без Authorization с того же
+    # адреса тоже должен увидеть свою запись. IP определяется как в троттлинге,
+    # с учетом NINJA_NUM_PROXIES, иначе за балансировщиком пинились бы все клиенты
+    keys = [f'primary_pin_{BaseThrottle().get_ident(request)}']
+    token = request.headers.get('Authorization')
+    if token:
+        keys.append(f'primary_pin_{hashlib.sha256(token.encode()).hexdigest()}')
+    return keys
+
+
+def pin_to_primary(request):
+    cache.set_many(dict.fromkeys(_pin_keys(request), True), settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(request):
+    return bool(cache.get_many(_pin_keys(request)))
+
+
+def read_from_replica(view):
+    # Чтения внутри view идут на реплику, если клиент недавно ничего не писал
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not replica_enabled() or is_pinned(request):
+            return view(request, *args, **kwargs)
+
+        token = _use_replica.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get():
+            return REPLICA_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
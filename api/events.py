@@ -0,0 +1,151 @@
+import asyncio
+import json
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from ninja.errors import HttpError
+from ninja.responses import NinjaJSONEncoder
+import logging
+
+from .throttling import count
+
+logger = logging.getLogger('api')
+
+OVERFLOW = object()
+
+
+class Event:
+    def __init__(self, event_id, event_type, article_id, data):
+        self.id = event_id
+        self.type = event_type
+        self.article_id = article_id
+        # Сериализуем один раз при публикации, а не для каждого подписчика
+        payload = json.dumps(data, cls=NinjaJSONEncoder, ensure_ascii=False)
+        self.encoded = f'id: {event_id}\nevent: comment.{event_type}\ndata: {payload}\n\n'
+
+
+class Subscriber:
+    def __init__(self, loop, article_id, queue_size):
+        self.loop = loop
+        self.article_id = article_id
+        self.queue = asyncio.Queue(queue_size)
+        self.overflowed = False
+
+    def wants(self, event):
+        return self.article_id is None or self.article_id == event.article_id
+
+    def push(self, event):
+        # Медленный клиент не должен копить события в памяти бесконечно:
+        # при переполнении очереди поток закрывается, клиент переподключается
+        # с Last-Event-ID и дочитывает пропущенное из буфера брокера
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(OVERFLOW)
+
+
+class CommentBroker:
+    def __init__(self, buffer_size, queue_size):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._buffer = deque(maxlen=buffer_size)
+        self._subscribers = set()
+
+    def publish(self, event_type, article_id, data):
+        with self._lock:
+            self._last_id += 1
+            event = Event(self._last_id, event_type, article_id, data)
+            self._buffer.append(event)
+            subscribers = [sub for sub in self._subscribers if sub.wants(event)]
+
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub.push, event)
+            except RuntimeError:
+                self.unsubscribe(sub)
+        count('sse.published')
+        return event
+
+    def subscribe(self, article_id=None, last_event_id=None):
+        sub = Subscriber(asyncio.get_running_loop(), article_id, self.queue_size)
+        with self._lock:
+            resumable = (
+                last_event_id is None
+                or last_event_id <= self._last_id
+                and (not self._buffer or self._buffer[0].id <= last_event_id + 1)
+            )
+            backlog = []
+            if last_event_id is not None and resumable:
+                backlog = [e for e in self._buffer if e.id > last_event_id and sub.wants(e)]
+            self._subscribers.add(sub)
+        return sub, backlog, resumable
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+comment_events = CommentBroker(settings.SSE_BUFFER_SIZE, settings.SSE_QUEUE_SIZE)
+
+
+def get_last_event_id(request):
+    value = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+async def _stream(broker, sub, backlog, resumable):
+    try:
+        yield f'retry: {settings.SSE_RETRY_MS}\n\n'
+        if not resumable:
+            # Пропущенные события уже вытеснены из буфера: клиенту нужно
+            # один раз перечитать список через GET /api/comments
+            yield 'event: reset\ndata: {}\n\n'
+        for event in backlog:
+            yield event.encoded
+        while True:
+            try:
+                event = await asyncio.wait_for(sub.queue.get(), settings.SSE_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if event is OVERFLOW:
+                count('sse.overflow')
+                logger.warning('Подписчик SSE не успевает читать события, поток закрыт')
+                yield 'event: overflow\ndata: {}\n\n'
+                return
+            yield event.encoded
+    finally:
+        broker.unsubscribe(sub)
+
+
+def stream_response(request, article_id=None, broker=comment_events):
+    # Под WSGI Django собирает асинхронный итератор в список до отправки:
+    # бесконечный поток не отдал бы ни байта и занял бы поток навсегда
+    if not isinstance(request, ASGIRequest):
+        logger.warning(f'Запрос потока событий не под ASGI: {request.path}')
+        raise HttpError(501, 'Поток событий доступен только под ASGI-сервером')
+
+    sub, backlog, resumable = broker.subscribe(article_id, get_last_event_id(request))
+    response = StreamingHttpResponse(
+        _stream(broker, sub, backlog, resumable), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.archive import archive_cutoff, archive_comments, archive_articles
+
+
+class Command(BaseCommand):
+    help = 'Переносит старые комментарии и статьи в архивные таблицы небольшими пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=settings.ARCHIVE_AFTER_DAYS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0.1, help='Пауза между пачками, секунд')
+        parser.add_argument('--max-batches', type=int, default=None)
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff(options['older_than_days'])
+        batches = 0
+        totals = {'comments': 0, 'articles': 0}
+        for name, archive in (('comments', archive_comments), ('articles', archive_articles)):
+            while options['max_batches'] is None or batches < options['max_batches']:
+                moved = archive(cutoff, options['batch_size'])
+                batches += 1
+                totals[name] += moved
+                if moved < options['batch_size']:
+                    break
+                time.sleep(options['sleep'])
+        self.stdout.write(
+            f'В архив перенесено комментариев: {totals["comments"]}, статей: {totals["articles"]}'
+        )
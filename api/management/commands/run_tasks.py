@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.outbox import run_pending
+
+
+class Command(BaseCommand):
+    help = 'Обрабатывает фоновые задачи из таблицы outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Обработать очередь один раз и выйти')
+        parser.add_argument('--batch', type=int, default=100)
+        parser.add_argument('--interval', type=float, default=1.0)
+
+    def handle(self, *args, **options):
+        while True:
+            done = run_pending(options['batch'])
+            if done:
+                self.stdout.write(f'Выполнено задач: {done}')
+            if options['once']:
+                return
+            if done < options['batch']:
+                time.sleep(options['interval'])
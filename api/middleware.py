@@ -0,0 +1,147 @@
+import json
+import threading
+
+from django.conf import settings
+from django.http import JsonResponse
+import logging
+
+from .db_router import pin_to_primary, replica_enabled
+from .throttling import count, SAFE_METHODS
+
+logger = logging.getLogger('api')
+
+
+class ConcurrencyLimitMiddleware:
+    # Отсекает запросы к API, когда одновременно обрабатывается больше
+    # MAX_CONCURRENT_REQUESTS, чтобы не исчерпать соединения с базой.
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limit = getattr(settings, 'MAX_CONCURRENT_REQUESTS', 0)
+        self.timeout = getattr(settings, 'CONCURRENCY_QUEUE_TIMEOUT', 0)
+        self.semaphore = threading.BoundedSemaphore(self.limit) if self.limit else None
+
+    def __call__(self, request):
+        if self.semaphore is None or not request.path.startswith('/api/'):
+            return self.get_response(request)
+
+        if not self.semaphore.acquire(timeout=self.timeout):
+            count('concurrency.shed')
+            logger.warning(f'Запрос отклонен из-за перегрузки: {request.path}')
+            response = JsonResponse({'detail': 'Сервер перегружен, повторите позже'}, status=503)
+            response['Retry-After'] = '1'
+            return response
+
+        try:
+            return self.get_response(request)
+        finally:
+            self.semaphore.release()
+
+
+class ReplicaPinMiddleware:
+    # После успешной записи клиент на REPLICA_PIN_SECONDS читает с primary,
+    # чтобы не увидеть устаревшие данные из-за задержки репликации.
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            replica_enabled()
+            and request.method not in SAFE_METHODS
+            and request.path.startswith('/api/')
+            and response.status_code < 400
+        ):
+            pin_to_primary(request)
+        return response
+
+
+def get_body_limit(path):
+    # Побеждает самый длинный подходящий префикс из API_BODY_LIMITS
+    for prefix, limit in sorted(settings.API_BODY_LIMITS.items(), key=lambda item: len(item[0]), reverse=True):
+        if path.startswith(prefix):
+            return limit
+    return None
+
+
+def _reject_too_large(path, size, limit):
+    count('body_limit.rejected')
+    logger.warning(f'Слишком большое тело запроса: {path} ({size} байт)')
+    return {'detail': f'Тело запроса больше {limit} байт'}
+
+
+class BodySizeLimitMiddleware:
+    # Под WSGI отклоняет запрос по заголовку Content-Length до чтения тела,
+    # чтобы многомегабайтный JSON не буферизовался в памяти воркера. Под ASGI
+    # Django читает тело раньше middleware, там работает BodySizeLimitASGIMiddleware.
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        limit = get_body_limit(request.path)
+        if limit is None:
+            return self.get_response(request)
+
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return JsonResponse({'detail': 'Некорректный Content-Length'}, status=400)
+
+        if content_length > limit:
+            return JsonResponse(_reject_too_large(request.path, content_length, limit), status=413)
+
+        return self.get_response(request)
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class BodySizeLimitASGIMiddleware:
+    # ASGIHandler складывает все тело во временный файл еще до middleware
+    # Django. Обертка проверяет Content-Length и считает байты по мере
+    # получения, обрывая и запросы без Content-Length (chunked).
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        limit = get_body_limit(scope['path']) if scope['type'] == 'http' else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get('headers') or [])
+        try:
+            content_length = int(headers.get(b'content-length') or 0)
+        except ValueError:
+            return await self.respond(send, 400, {'detail': 'Некорректный Content-Length'})
+        if content_length > limit:
+            return await self.respond(send, 413, _reject_too_large(scope['path'], content_length, limit))
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > limit:
+                    raise BodyTooLarge
+            return message
+
+        try:
+            await self.app(scope, limited_receive, send)
+        except BodyTooLarge:
+            # Тело читается до формирования ответа, так что ответ еще не начат
+            await self.respond(send, 413, _reject_too_large(scope['path'], received, limit))
+
+    async def respond(self, send, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+        })
+        await send({'type': 'http.response.body', 'body': body})
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleViewStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('article_id', models.BigIntegerField()),
+                ('period', models.CharField(max_length=10)),
+                ('period_start', models.DateField()),
+                ('views', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Просмотры статьи',
+                'verbose_name_plural': 'Просмотры статей',
+                'indexes': [models.Index(fields=['period', 'period_start', '-views'], name='api_article_period_3ff302_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='articleviewstat',
+            constraint=models.UniqueConstraint(fields=('article_id', 'period', 'period_start'), name='unique_article_view_period'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:25
+
+from django.db import migrations, models
+
+
+def delete_done_tasks(apps, schema_editor):
+    apps.get_model('api', 'OutboxTask').objects.filter(status='done').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_article_view_stat'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_done_tasks, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='outboxtask',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Ожидает'), ('running', 'Выполняется'), ('failed', 'Ошибка')], default='pending', max_length=20),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 import secrets
 import logging
 
@@ -43,6 +44,7 @@ class Article(models.Model):
         verbose_name = 'Статья'
         verbose_name_plural = 'Статьи'
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['created_at'], name='api_article_created_at_idx')]
 
 
 class Comment(models.Model):
@@ -53,10 +55,94 @@ class Comment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f'Комментарий от {self.author.username} к статье {self.article.title}'
+        return f'Комментарий {self.pk} к статье {self.article_id}'
 
     class Meta:
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['created_at'], name='api_comment_created_at_idx')]
+
+
+class OutboxTask(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Ожидает'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ['run_at']
+        indexes = [models.Index(fields=['status', 'run_at'])]
+
+
+class ArchivedArticle(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=200)
+    content = models.TextField()
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_articles')
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(db_index=True)
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.title
+
+    class Meta:
+        verbose_name = 'Архивная статья'
+        verbose_name_plural = 'Архивные статьи'
+        ordering = ['-created_at']
+
+
+class ArchivedComment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    article_id = models.BigIntegerField(db_index=True)
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_comments')
+    content = models.TextField()
+    created_at = models.DateTimeField(db_index=True)
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'Комментарий {self.pk} к статье {self.article_id}'
+
+    class Meta:
+        verbose_name = 'Архивный комментарий'
+        verbose_name_plural = 'Архивные комментарии'
+        ordering = ['-created_at']
+
+
+class ArticleViewStat(models.Model):
+    article_id = models.BigIntegerField()
+    period = models.CharField(max_length=10)
+    period_start = models.DateField()
+    views = models.PositiveBigIntegerField(default=0)
 
+    def __str__(self):
+        return f'Статья {self.article_id}: {self.views} за {self.period} с {self.period_start}'
+
+    class Meta:
+        verbose_name = 'Просмотры статьи'
+        verbose_name_plural = 'Просмотры статей'
+        constraints = [
+            models.UniqueConstraint(fields=['article_id', 'period', 'period_start'], name='unique_article_view_period'),
+        ]
+        indexes = [models.Index(fields=['period', 'period_start', '-views'])]
@@ -0,0 +1,103 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import OutboxTask
+
+logger = logging.getLogger('api')
+
+_handlers = {}
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def task(name):
+    def decorator(func):
+        _handlers[name] = func
+        return func
+    return decorator
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.TASK_WORKERS, thread_name_prefix='outbox'
+            )
+        return _executor
+
+
+def enqueue(name, **payload):
+    # Задача сохраняется в той же транзакции, что и запись, и запускается
+    # только после коммита. Если процесс упадет, ее подберет run_tasks.
+    outbox = OutboxTask.objects.create(name=name, payload=payload)
+    if settings.TASKS_MODE == 'thread':
+        transaction.on_commit(lambda: get_executor().submit(_run_in_thread, outbox.pk))
+    elif settings.TASKS_MODE == 'sync':
+        transaction.on_commit(lambda: run_task(outbox.pk))
+    return outbox
+
+
+def _run_in_thread(task_id):
+    try:
+        run_task(task_id)
+    finally:
+        connections.close_all()
+
+
+def backoff(attempts):
+    return timedelta(seconds=settings.TASK_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def due_tasks():
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.TASK_LEASE_SECONDS)
+    return OutboxTask.objects.filter(
+        Q(status=OutboxTask.STATUS_PENDING, run_at__lte=now)
+        | Q(status=OutboxTask.STATUS_RUNNING, locked_at__lt=stale)
+    )
+
+
+def claim(task_id):
+    return due_tasks().filter(pk=task_id).update(
+        status=OutboxTask.STATUS_RUNNING,
+        locked_at=timezone.now(),
+        attempts=F('attempts') + 1,
+    ) == 1
+
+
+def run_task(task_id):
+    if not claim(task_id):
+        return False
+
+    outbox = OutboxTask.objects.get(pk=task_id)
+    try:
+        _handlers[outbox.name](**outbox.payload)
+    except Exception as exc:
+        outbox.last_error = repr(exc)
+        if outbox.attempts >= settings.TASK_MAX_ATTEMPTS:
+            outbox.status = OutboxTask.STATUS_FAILED
+            logger.exception(f'Фоновая задача {outbox} завершилась ошибкой')
+        else:
+            outbox.status = OutboxTask.STATUS_PENDING
+            outbox.run_at = timezone.now() + backoff(outbox.attempts)
+            logger.warning(f'Фоновая задача {outbox} будет повторена: {exc!r}')
+        outbox.locked_at = None
+        outbox.save(update_fields=['status', 'run_at', 'locked_at', 'last_error'])
+        return False
+
+    # Выполненная задача больше не нужна: таблица хранит только очередь и ошибки
+    OutboxTask.objects.filter(pk=outbox.pk).delete()
+    return True
+
+
+def run_pending(limit=100):
+    task_ids = list(due_tasks().values_list('pk', flat=True)[:limit])
+    return sum(run_task(task_id) for task_id in task_ids)
@@ -0,0 +1,29 @@
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    # COUNT(*) на больших таблицах PostgreSQL читает всю таблицу. Если по
+    # статистике планировщика строк больше порога, показываем оценку.
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if connections[queryset.db].vendor == 'postgresql':
+            estimate = self.estimate_count(queryset)
+            if estimate >= self.estimate_threshold:
+                return estimate
+        return super().count
+
+    def estimate_count(self, queryset):
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
@@ -0,0 +1,137 @@
+import atexit
+from collections import Counter
+from datetime import timedelta
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, connections
+from django.utils import timezone
+
+from .models import ArticleViewStat
+
+logger = logging.getLogger('api')
+
+PERIODS = {
+    'day': lambda day: day,
+    'week': lambda day: day - timedelta(days=day.weekday()),
+    'month': lambda day: day.replace(day=1),
+}
+
+
+def period_start(period, now=None):
+    return PERIODS[period](timezone.localdate(now))
+
+
+class ViewCounter:
+    # Просмотры копятся в памяти процесса и раз в POPULARITY_FLUSH_INTERVAL
+    # секунд сбрасываются одним INSERT ... ON CONFLICT сразу во все окна
+    # (день, неделя, ...), так что рейтинг читается готовым без GROUP BY.
+    batch_size = 300
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def record(self, article_id):
+        with self._lock:
+            self._counts[article_id] += 1
+            if self._flusher is None and settings.POPULARITY_FLUSH_INTERVAL:
+                self._flusher = threading.Thread(target=self._run_flusher, name='view-counter', daemon=True)
+                self._flusher.start()
+                # Поток-демон при остановке воркера просто обрывается
+                atexit.register(self._flush_at_exit)
+
+    def pending(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def drain(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        return counts
+
+    def flush(self):
+        counts = self.drain()
+        if not counts:
+            return 0
+        try:
+            upsert_views(counts)
+        except Exception:
+            with self._lock:
+                self._counts.update(counts)
+            raise
+        return sum(counts.values())
+
+    def _flush_at_exit(self):
+        try:
+            flushed = self.flush()
+        except Exception:
+            logger.exception('Не удалось сохранить счетчики просмотров при остановке')
+            return
+        if flushed:
+            logger.info(f'При остановке сохранено просмотров: {flushed}')
+
+    def _run_flusher(self):
+        pruned_on = None
+        while True:
+            time.sleep(settings.POPULARITY_FLUSH_INTERVAL)
+            try:
+                self.flush()
+                today = timezone.localdate()
+                if pruned_on != today:
+                    prune_views()
+                    pruned_on = today
+            except Exception:
+                logger.exception('Не удалось сохранить счетчики просмотров')
+            finally:
+                connections.close_all()
+
+
+def upsert_views(counts, now=None):
+    quote = connection.ops.quote_name
+    table = quote(ArticleViewStat._meta.db_table)
+    starts = {
+        period: connection.ops.adapt_datefield_value(period_start(period, now))
+        for period in settings.POPULARITY_WINDOWS
+    }
+    rows = [
+        (article_id, period, start, views)
+        for article_id, views in counts.items()
+        for period, start in starts.items()
+    ]
+    columns = ', '.join(quote(c) for c in ('article_id', 'period', 'period_start', 'views'))
+    with connection.cursor() as cursor:
+        for i in range(0, len(rows), ViewCounter.batch_size):
+            batch = rows[i:i + ViewCounter.batch_size]
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) VALUES {", ".join(["(%s, %s, %s, %s)"] * len(batch))} '
+                f'ON CONFLICT ({quote("article_id")}, {quote("period")}, {quote("period_start")}) '
+                f'DO UPDATE SET {quote("views")} = {table}.{quote("views")} + excluded.{quote("views")}',
+                [value for row in batch for value in row],
+            )
+
+
+def prune_views(now=None):
+    # Окна календарные, рейтинг читает только текущий период: строки
+    # прошедших дней/недель/месяцев больше не нужны
+    deleted = 0
+    for period in PERIODS:
+        deleted += ArticleViewStat.objects.filter(
+            period=period, period_start__lt=period_start(period, now)
+        ).delete()[0]
+    if deleted:
+        logger.info(f'Удалено устаревших счетчиков просмотров: {deleted}')
+    return deleted
+
+
+def top_article_ids(period, limit):
+    return list(
+        ArticleViewStat.objects.filter(period=period, period_start=period_start(period))
+        .order_by('-views').values_list('article_id', 'views')[:limit]
+    )
+
+
+view_counter = ViewCounter()
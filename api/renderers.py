@@ -0,0 +1,30 @@
+from importlib.util import find_spec
+
+from ninja.renderers import BaseRenderer, JSONRenderer
+from ninja.responses import NinjaJSONEncoder
+
+# msgpack импортируется при первом ответе в MessagePack, а не при загрузке URLconf
+MSGPACK_AVAILABLE = find_spec('msgpack') is not None
+
+MSGPACK_MEDIA_TYPES = ('application/msgpack', 'application/x-msgpack')
+
+
+class UTF8JSONRenderer(JSONRenderer):
+    # Кириллица без \uXXXX-экранирования: ответ почти вдвое меньше
+    json_dumps_params = {'ensure_ascii': False}
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+
+    def render(self, request, data, *, response_status):
+        import msgpack
+
+        return msgpack.packb(data, default=NinjaJSONEncoder().default)
+
+
+def accepts_msgpack(request):
+    if not MSGPACK_AVAILABLE:
+        return False
+    accept = request.headers.get('Accept', '')
+    return any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES)
@@ -1,4 +1,5 @@
-from ninja import Schema
+from django.conf import settings
+from ninja import Schema, Field
 from typing import Optional
 from datetime import datetime
 
@@ -27,14 +28,14 @@ class CategorySchema(Schema):
 
 
 class ArticleCreateSchema(Schema):
-    title: str
-    content: str
+    title: str = Field(..., max_length=200)
+    content: str = Field(..., max_length=settings.ARTICLE_CONTENT_MAX_LENGTH)
     category_id: Optional[int] = None
 
 
 class ArticleUpdateSchema(Schema):
-    title: Optional[str] = None
-    content: Optional[str] = None
+    title: Optional[str] = Field(None, max_length=200)
+    content: Optional[str] = Field(None, max_length=settings.ARTICLE_CONTENT_MAX_LENGTH)
     category_id: Optional[int] = None
 
 
@@ -54,11 +55,11 @@ class ArticleSchema(Schema):
 
 class CommentCreateSchema(Schema):
     article_id: int
-    content: str
+    content: str = Field(..., max_length=settings.COMMENT_CONTENT_MAX_LENGTH)
 
 
 class CommentUpdateSchema(Schema):
-    content: str
+    content: str = Field(..., max_length=settings.COMMENT_CONTENT_MAX_LENGTH)
 
 
 class CommentSchema(Schema):
@@ -74,3 +75,9 @@ class CommentSchema(Schema):
     class Config:
         from_attributes = True
 
+
+class TopArticleSchema(Schema):
+    id: int
+    title: str
+    author_username: str
+    views: int
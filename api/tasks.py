@@ -0,0 +1,24 @@
+from .outbox import task
+
+# Точки расширения для побочных эффектов записи (кеш, уведомления, поиск).
+# Сама запись уже залогирована во view, поэтому обработчики по умолчанию пустые.
+
+
+@task('article_saved')
+def article_saved(article_id, user_id, created):
+    pass
+
+
+@task('article_deleted')
+def article_deleted(article_id, user_id):
+    pass
+
+
+@task('comment_saved')
+def comment_saved(comment_id, article_id, user_id, created):
+    pass
+
+
+@task('comment_deleted')
+def comment_deleted(comment_id, article_id, user_id):
+    pass
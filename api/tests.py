@@ -1,11 +1,63 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+import asyncio
+import gzip
+from unittest import mock, skipUnless
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test.utils import CaptureQueriesContext
+from django.http import HttpResponse
+from ninja.conf import settings as ninja_settings
+from django.test import TestCase, RequestFactory, override_settings, tag
 from django.contrib.auth import get_user_model
-from .models import Article, Comment, Category
+from django.utils import timezone
+from . import renderers
+from .compression import CompressionMiddleware, choose_encoding
+from .middleware import BodySizeLimitASGIMiddleware
+from .paginators import EstimatedCountPaginator
+from .events import CommentBroker, comment_events, _stream
+from .models import Article, Comment, Category, OutboxTask, ArchivedArticle, ArchivedComment, ArticleViewStat
+from .outbox import run_task, run_pending
+from .popularity import ViewCounter, view_counter, period_start, prune_views
+from .throttling import (
+    IPTokenBucketThrottle, UserTokenBucketThrottle, MemoryBucketBackend,
+    memory_backend, get_throttle_stats, reset_throttle_stats
+)
+from .db_router import ReplicaRouter, read_from_replica, is_pinned, pin_to_primary
 import json
 
+
+def read_uncommitted(sender, connection, **kwargs):
+    # replica — второе соединение к той же SQLite в памяти; без этого оно
+    # упирается в блокировку таблиц незакоммиченной транзакцией теста
+    if connection.alias == 'replica':
+        connection.cursor().execute('PRAGMA read_uncommitted = 1')
+
+
+connection_created.connect(read_uncommitted)
+
 User = get_user_model()
 
 
+def make_user(username='author', token=None, **kwargs):
+    return User.objects.create_user(username=username, password='pass123', token=token, **kwargs)
+
+
+def make_article(author, **kwargs):
+    kwargs.setdefault('title', 'Test Article')
+    kwargs.setdefault('content', 'Content')
+    return Article.objects.create(author=author, **kwargs)
+
+
+def make_comment(article, author, **kwargs):
+    kwargs.setdefault('content', 'Comment')
+    return Comment.objects.create(article=article, author=author, **kwargs)
+
+
 class AuthTests(TestCase):
     def setUp(self):
         self.user_data = {
@@ -44,11 +96,12 @@ class AuthTests(TestCase):
 
 
 class ArticleTests(TestCase):
-    def setUp(self):
-        self.user = User.objects.create_user(username='author', password='pass123')
-        self.user.token = 'test-token-123'
-        self.user.save()
-        self.category = Category.objects.create(name='Технологии')
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user(token='test-token-123')
+        cls.category = Category.objects.create(name='Технологии')
 
     def test_create_article_success(self):
         response = self.client.post('/api/articles',
@@ -62,6 +115,29 @@ class ArticleTests(TestCase):
             json.dumps({'title': 'Test Article', 'content': 'Content here'}),
             content_type='application/json')
         self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {'detail': 'Требуется авторизация'})
+
+    def test_create_article_raw_token_header(self):
+        response = self.client.post('/api/articles',
+            json.dumps({'title': 'Test Article', 'content': 'Content here'}),
+            content_type='application/json', HTTP_AUTHORIZATION='test-token-123')
+        self.assertEqual(response.status_code, 200)
+
+    def test_create_article_body_token_disabled(self):
+        response = self.client.post('/api/articles',
+            json.dumps({'title': 'Test Article', 'content': 'Content here', 'token': 'test-token-123'}),
+            content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(AUTH_BODY_TOKEN_FALLBACK=True)
+    def test_create_article_body_token_parsed_once(self):
+        with mock.patch('api.auth.json.loads', wraps=json.loads) as loads:
+            response = self.client.post('/api/articles',
+                json.dumps({'title': 'Test Article', 'content': 'Content here', 'token': 'test-token-123'}),
+                content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(loads.call_count, 1)
+        self.assertEqual(Article.objects.get().author, self.user)
 
     def test_list_articles(self):
         Article.objects.create(title='Article 1', content='Content', author=self.user)
@@ -86,7 +162,7 @@ class ArticleTests(TestCase):
         self.assertEqual(article.title, 'New Title')
 
     def test_update_other_article(self):
-        other_user = User.objects.create_user(username='other', password='pass')
+        other_user = make_user('other')
         article = Article.objects.create(title='Test', content='Content', author=other_user)
         response = self.client.put(f'/api/articles/{article.id}',
             json.dumps({'title': 'Hacked'}),
@@ -100,18 +176,19 @@ class ArticleTests(TestCase):
         self.assertEqual(Article.objects.count(), 0)
 
     def test_delete_other_article(self):
-        other_user = User.objects.create_user(username='other', password='pass')
+        other_user = make_user('other')
         article = Article.objects.create(title='Test', content='Content', author=other_user)
         response = self.client.delete(f'/api/articles/{article.id}', HTTP_AUTHORIZATION='Bearer test-token-123')
         self.assertEqual(response.status_code, 403)
 
 
 class CommentTests(TestCase):
-    def setUp(self):
-        self.user = User.objects.create_user(username='author', password='pass123')
-        self.user.token = 'test-token-123'
-        self.user.save()
-        self.article = Article.objects.create(title='Test Article', content='Content', author=self.user)
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user(token='test-token-123')
+        cls.article = make_article(cls.user)
 
     def test_create_comment_success(self):
         response = self.client.post('/api/comments',
@@ -125,6 +202,7 @@ class CommentTests(TestCase):
             json.dumps({'article_id': self.article.id, 'content': 'Comment'}),
             content_type='application/json')
         self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {'detail': 'Требуется авторизация'})
 
     def test_list_comments(self):
         Comment.objects.create(article=self.article, author=self.user, content='Comment 1')
@@ -149,7 +227,7 @@ class CommentTests(TestCase):
         self.assertEqual(comment.content, 'New')
 
     def test_update_other_comment(self):
-        other_user = User.objects.create_user(username='other', password='pass')
+        other_user = make_user('other')
         comment = Comment.objects.create(article=self.article, author=other_user, content='Test')
         response = self.client.put(f'/api/comments/{comment.id}',
             json.dumps({'content': 'Hacked'}),
@@ -163,8 +241,631 @@ class CommentTests(TestCase):
         self.assertEqual(Comment.objects.count(), 0)
 
     def test_delete_other_comment(self):
-        other_user = User.objects.create_user(username='other', password='pass')
+        other_user = make_user('other')
         comment = Comment.objects.create(article=self.article, author=other_user, content='Test')
         response = self.client.delete(f'/api/comments/{comment.id}', HTTP_AUTHORIZATION='Bearer test-token-123')
         self.assertEqual(response.status_code, 403)
 
+
+@override_settings(THROTTLE_RATES={'auth': '10/min', 'write': '60/min'})
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        memory_backend.reset()
+        reset_throttle_stats()
+
+    def tearDown(self):
+        memory_backend.reset()
+
+    def test_token_bucket_exhausts_and_refills(self):
+        throttle = IPTokenBucketThrottle('auth', rate='2/min')
+        request = RequestFactory().post('/api/auth/login')
+        throttle.timer = lambda: 1000.0
+        self.assertTrue(throttle.allow_request(request))
+        self.assertTrue(throttle.allow_request(request))
+        self.assertFalse(throttle.allow_request(request))
+        self.assertAlmostEqual(throttle.wait(), 30.0)
+        throttle.timer = lambda: 1030.0
+        self.assertTrue(throttle.allow_request(request))
+
+    def test_write_only_skips_safe_methods(self):
+        throttle = IPTokenBucketThrottle('write', rate='1/min', write_only=True)
+        request = RequestFactory().get('/api/articles')
+        for _ in range(3):
+            self.assertTrue(throttle.allow_request(request))
+
+    def test_user_throttle_keyed_by_token(self):
+        throttle = UserTokenBucketThrottle('write', rate='1/min')
+        factory = RequestFactory()
+        self.assertTrue(throttle.allow_request(factory.post('/', HTTP_AUTHORIZATION='Bearer a')))
+        self.assertTrue(throttle.allow_request(factory.post('/', HTTP_AUTHORIZATION='Bearer b')))
+        self.assertFalse(throttle.allow_request(factory.post('/', HTTP_AUTHORIZATION='Bearer a')))
+
+    def test_login_returns_429_with_retry_after(self):
+        User.objects.create_user(username='testuser', password='testpass123')
+        limit = IPTokenBucketThrottle('auth').capacity
+        for _ in range(limit):
+            self.client.post('/api/auth/login',
+                json.dumps({'username': 'testuser', 'password': 'wrongpass'}),
+                content_type='application/json')
+        response = self.client.post('/api/auth/login',
+            json.dumps({'username': 'testuser', 'password': 'wrongpass'}),
+            content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(get_throttle_stats()['auth.throttled'], 1)
+
+    def test_login_throttled_despite_spoofed_forwarded_for(self):
+        User.objects.create_user(username='testuser', password='testpass123')
+        limit = IPTokenBucketThrottle('auth').capacity
+        statuses = [
+            self.client.post('/api/auth/login',
+                json.dumps({'username': 'testuser', 'password': 'wrongpass'}),
+                content_type='application/json', HTTP_X_FORWARDED_FOR=f'10.0.0.{i}').status_code
+            for i in range(limit + 1)
+        ]
+        self.assertEqual(statuses[-1], 429)
+
+    def test_unauthorized_writes_are_throttled_by_ip(self):
+        limit = IPTokenBucketThrottle('write').capacity
+        responses = [
+            self.client.post('/api/articles',
+                json.dumps({'title': 'Спам', 'content': 'Спам'}),
+                content_type='application/json', HTTP_AUTHORIZATION='Bearer bogus')
+            for _ in range(limit + 1)
+        ]
+        self.assertEqual({r.status_code for r in responses[:-1]}, {401})
+        self.assertEqual(responses[-1].status_code, 429)
+        self.assertIn('Retry-After', responses[-1])
+        self.assertEqual(get_throttle_stats()['write.throttled'], 1)
+
+    def test_memory_backend_evicts_full_and_idle_buckets(self):
+        backend = MemoryBucketBackend(max_size=2)
+        backend.take('full', 1, 1.0, 0.0)
+        backend.take('a', 10, 1.0, 5.0)
+        backend.take('b', 10, 1.0, 5.0)
+        self.assertEqual(list(backend._buckets), ['a', 'b'])
+
+        backend = MemoryBucketBackend(max_size=10)
+        for i in range(10):
+            backend.take(f'k{i}', 10, 0.001, 0.0)
+        backend.take('k0', 10, 0.001, 1.0)
+        backend.take('k10', 10, 0.001, 1.0)
+        self.assertEqual(len(backend._buckets), 9)
+        self.assertIn('k0', backend._buckets)
+        self.assertNotIn('k1', backend._buckets)
+        self.assertNotIn('k2', backend._buckets)
+
+
+class ReplicaRoutingTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+        self.request = RequestFactory().get('/api/articles', HTTP_AUTHORIZATION='Bearer test-token-123')
+
+    def route(self, request):
+        return read_from_replica(lambda request: self.router.db_for_read(Article))(request)
+
+    def test_writes_go_to_primary(self):
+        self.assertEqual(self.router.db_for_write(Article), 'default')
+
+    def test_reads_outside_replica_views_go_to_primary(self):
+        self.assertEqual(self.router.db_for_read(Article), 'default')
+
+    def test_replica_views_read_from_replica(self):
+        self.assertEqual(self.route(self.request), 'replica')
+        self.assertEqual(self.router.db_for_read(Article), 'default')
+
+    def test_replica_disabled_reads_from_primary(self):
+        with mock.patch('api.db_router.replica_enabled', return_value=False):
+            self.assertEqual(self.route(self.request), 'default')
+
+    def test_read_views_query_replica_connection(self):
+        article = make_article(make_user())
+        with CaptureQueriesContext(connections['replica']) as replica, \
+                CaptureQueriesContext(connections['default']) as primary:
+            self.assertEqual(len(self.client.get('/api/articles').json()), 1)
+            self.assertEqual(self.client.get(f'/api/articles/{article.id}').status_code, 200)
+        self.assertTrue(replica.captured_queries)
+        self.assertFalse(primary.captured_queries)
+
+    def test_pinned_client_reads_from_primary(self):
+        pin_to_primary(self.request)
+        self.assertEqual(self.route(self.request), 'default')
+
+    def test_successful_write_pins_token_and_ip(self):
+        make_user(token='test-token-123')
+        self.client.post('/api/articles',
+            json.dumps({'title': 'Test', 'content': 'Content'}),
+            content_type='application/json', HTTP_AUTHORIZATION='Bearer test-token-123')
+        self.assertTrue(is_pinned(self.request))
+        self.assertTrue(is_pinned(RequestFactory().get('/api/articles')))
+        self.assertFalse(is_pinned(RequestFactory().get('/api/articles', REMOTE_ADDR='10.0.0.2')))
+        with CaptureQueriesContext(connections['replica']) as replica:
+            self.client.get('/api/articles')
+        self.assertFalse(replica.captured_queries)
+
+    def test_pin_by_forwarded_client_ip_behind_proxy(self):
+        factory = RequestFactory()
+        with mock.patch.object(ninja_settings, 'NUM_PROXIES', 1):
+            pin_to_primary(factory.post('/api/articles', HTTP_X_FORWARDED_FOR='10.0.0.1'))
+            self.assertTrue(is_pinned(factory.get('/api/articles', HTTP_X_FORWARDED_FOR='10.0.0.1')))
+            self.assertFalse(is_pinned(factory.get('/api/articles', HTTP_X_FORWARDED_FOR='10.0.0.2')))
+
+
+@override_settings(TASKS_MODE='sync', TASK_MAX_ATTEMPTS=2, TASK_RETRY_DELAY=10)
+class OutboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user(token='test-token-123')
+
+    def test_create_article_runs_task_after_commit(self):
+        handler = mock.Mock()
+        with mock.patch.dict('api.outbox._handlers', {'article_saved': handler}):
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.client.post('/api/articles',
+                    json.dumps({'title': 'Test', 'content': 'Content'}),
+                    content_type='application/json', HTTP_AUTHORIZATION='Bearer test-token-123')
+            self.assertEqual(OutboxTask.objects.get().name, 'article_saved')
+            handler.assert_not_called()
+            for callback in callbacks:
+                callback()
+        self.assertEqual(response.status_code, 200)
+        handler.assert_called_once_with(article_id=response.json()['id'], user_id=self.user.id, created=True)
+        self.assertFalse(OutboxTask.objects.exists())
+
+    def test_failed_write_does_not_enqueue(self):
+        article = Article.objects.create(title='Test', content='Content', author=self.user)
+        make_user('other', token='other-token')
+        response = self.client.delete(f'/api/articles/{article.id}', HTTP_AUTHORIZATION='Bearer other-token')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(OutboxTask.objects.exists())
+
+    def test_failing_task_is_retried_with_backoff(self):
+        outbox = OutboxTask.objects.create(name='article_deleted', payload={'article_id': 1, 'user_id': 1})
+        handlers = {'article_deleted': mock.Mock(side_effect=RuntimeError('boom'))}
+        with mock.patch.dict('api.outbox._handlers', handlers), self.assertLogs('api', 'WARNING') as logs:
+            self.assertFalse(run_task(outbox.pk))
+            outbox.refresh_from_db()
+            self.assertEqual(outbox.status, OutboxTask.STATUS_PENDING)
+            self.assertGreater(outbox.run_at, timezone.now())
+            self.assertEqual(run_pending(), 0)
+
+            OutboxTask.objects.filter(pk=outbox.pk).update(run_at=timezone.now())
+            self.assertFalse(run_task(outbox.pk))
+        outbox.refresh_from_db()
+        self.assertEqual(outbox.status, OutboxTask.STATUS_FAILED)
+        self.assertEqual(outbox.attempts, 2)
+        self.assertIn('boom', outbox.last_error)
+        self.assertEqual([r.levelname for r in logs.records], ['WARNING', 'ERROR'])
+
+    def test_run_tasks_command_processes_pending(self):
+        OutboxTask.objects.create(name='comment_deleted', payload={'comment_id': 1, 'article_id': 1, 'user_id': 1})
+        call_command('run_tasks', once=True, stdout=StringIO())
+        self.assertFalse(OutboxTask.objects.exists())
+
+
+@skipUnless(apps.is_installed('django.contrib.admin'), 'админка отключена в профиле настроек')
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='pass', email='a@a.ru')
+        self.client.force_login(self.admin)
+        self.article = Article.objects.create(title='Test', content='Content', author=self.admin)
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_comment_changelist_queries_do_not_grow_with_rows(self):
+        Comment.objects.create(article=self.article, author=self.admin, content='1')
+        before = self.changelist_queries('/admin/api/comment/')
+        for i in range(5):
+            author = make_user(f'user{i}')
+            article = Article.objects.create(title=f'Article {i}', content='Content', author=author)
+            Comment.objects.create(article=article, author=author, content=str(i))
+        self.assertEqual(self.changelist_queries('/admin/api/comment/'), before)
+
+    def test_article_changelist_queries_do_not_grow_with_rows(self):
+        before = self.changelist_queries('/admin/api/article/')
+        for i in range(5):
+            category = Category.objects.create(name=f'Category {i}')
+            Article.objects.create(title=f'Article {i}', content='Content', author=self.admin, category=category)
+        self.assertEqual(self.changelist_queries('/admin/api/article/'), before)
+
+    def test_paginator_counts_exactly_outside_postgres(self):
+        paginator = EstimatedCountPaginator(Article.objects.all(), 100)
+        with mock.patch.object(EstimatedCountPaginator, 'estimate_count') as estimate:
+            self.assertEqual(paginator.count, 1)
+        estimate.assert_not_called()
+
+
+class CommentStreamTests(TestCase):
+    def setUp(self):
+        self.broker = CommentBroker(buffer_size=3, queue_size=2)
+
+    async def read(self, sub):
+        await asyncio.sleep(0)
+        return await asyncio.wait_for(sub.queue.get(), 1)
+
+    async def test_publish_fans_out_by_article(self):
+        everything, _, _ = self.broker.subscribe()
+        article_1, _, _ = self.broker.subscribe(article_id=1)
+        self.broker.publish('created', 2, {'id': 10})
+        self.broker.publish('created', 1, {'id': 11})
+        self.assertEqual((await self.read(everything)).id, 1)
+        self.assertEqual((await self.read(everything)).id, 2)
+        event = await self.read(article_1)
+        self.assertEqual(event.id, 2)
+        self.assertIn('event: comment.created', event.encoded)
+
+    async def test_resume_from_last_event_id(self):
+        for i in range(3):
+            self.broker.publish('created', 1, {'id': i})
+        sub, backlog, resumable = self.broker.subscribe(last_event_id=1)
+        self.assertTrue(resumable)
+        self.assertEqual([e.id for e in backlog], [2, 3])
+
+    async def test_resume_too_old_requests_reset(self):
+        for i in range(5):
+            self.broker.publish('created', 1, {'id': i})
+        _, backlog, resumable = self.broker.subscribe(last_event_id=1)
+        self.assertFalse(resumable)
+        self.assertEqual(backlog, [])
+
+    async def test_slow_consumer_overflows(self):
+        sub, backlog, resumable = self.broker.subscribe()
+        for i in range(3):
+            self.broker.publish('created', 1, {'id': i})
+        await asyncio.sleep(0)
+        self.assertTrue(sub.overflowed)
+        chunks = [chunk async for chunk in _stream(self.broker, sub, backlog, resumable)]
+        self.assertEqual(chunks[-1], 'event: overflow\ndata: {}\n\n')
+        self.assertEqual(self.broker.subscriber_count, 0)
+
+    def test_comment_writes_publish_events(self):
+        user = make_user(token='test-token-123')
+        article = make_article(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/comments',
+                json.dumps({'article_id': article.id, 'content': 'Hi'}),
+                content_type='application/json', HTTP_AUTHORIZATION='Bearer test-token-123')
+        comment_id = response.json()['id']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/comments/{comment_id}', HTTP_AUTHORIZATION='Bearer test-token-123')
+        created, deleted = list(comment_events._buffer)[-2:]
+        self.assertEqual((created.type, created.article_id), ('created', article.id))
+        self.assertIn('"content": "Hi"', created.encoded)
+        self.assertEqual(deleted.type, 'deleted')
+        self.assertIn(f'"id": {comment_id}', deleted.encoded)
+
+    async def test_stream_endpoint_resumes_from_header(self):
+        first = comment_events.publish('created', 7, {'id': 1})
+        comment_events.publish('created', 7, {'id': 2})
+        response = await self.async_client.get(
+            '/api/articles/7/comments/stream', headers={'Last-Event-ID': str(first.id)}
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertTrue((await anext(chunks)).startswith(b'retry:'))
+        self.assertIn(f'id: {first.id + 1}\n'.encode(), await anext(chunks))
+        await chunks.aclose()
+
+    def test_stream_rejected_under_wsgi(self):
+        with self.assertLogs('django.request', 'ERROR'):
+            response = self.client.get('/api/comments/stream')
+        self.assertEqual(response.status_code, 501)
+        self.assertEqual(comment_events.subscriber_count, 0)
+
+
+class CompressionTests(TestCase):
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpTestData(cls):
+        user = make_user()
+        Article.objects.bulk_create(
+            Article(title=f'Article {i}', content='Длинный текст статьи. ' * 50, author=user)
+            for i in range(20)
+        )
+
+    def test_choose_encoding_respects_quality(self):
+        self.assertEqual(choose_encoding('gzip, deflate, br'), 'br')
+        self.assertEqual(choose_encoding('gzip;q=1.0, br;q=0.5'), 'gzip')
+        self.assertEqual(choose_encoding('br;q=0, *'), 'zstd')
+        self.assertIsNone(choose_encoding('identity'))
+        self.assertIsNone(choose_encoding(''))
+
+    def test_large_list_is_gzipped(self):
+        response = self.client.get('/api/articles', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(len(data), 20)
+
+    def test_non_api_paths_are_not_compressed(self):
+        middleware = CompressionMiddleware(lambda request: HttpResponse('<input name="csrfmiddlewaretoken">' * 100))
+        response = middleware(RequestFactory().get('/admin/login/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = middleware(RequestFactory().get('/api/articles', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_small_body_is_not_compressed(self):
+        article = Article.objects.first()
+        Article.objects.filter(pk=article.pk).update(content='short')
+        response = self.client.get(f'/api/articles/{article.id}', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_uncompressed_without_accept_encoding(self):
+        response = self.client.get('/api/articles')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(len(response.json()), 20)
+
+    @skipUnless(renderers.MSGPACK_AVAILABLE, 'msgpack не установлен')
+    def test_msgpack_by_accept(self):
+        response = self.client.get('/api/articles', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertIn('Accept', response['Vary'])
+        import msgpack
+
+        data = msgpack.unpackb(response.content)
+        self.assertEqual(len(data), 20)
+        self.assertEqual(data[0]['author_username'], 'author')
+
+
+class ArchiveTests(TestCase):
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user(token='test-token-123')
+        old = timezone.now() - timedelta(days=800)
+        cls.old_article = make_article(cls.user, title='Old')
+        cls.old_comment = make_comment(cls.old_article, cls.user, content='Old comment')
+        cls.kept_article = make_article(cls.user, title='Old with new comment')
+        cls.kept_old_comment = make_comment(cls.kept_article, cls.user, content='Old comment 2')
+        Article.objects.filter(pk__in=[cls.old_article.pk, cls.kept_article.pk]).update(created_at=old)
+        Comment.objects.filter(pk__in=[cls.old_comment.pk, cls.kept_old_comment.pk]).update(created_at=old)
+        cls.hot_article = make_article(cls.user, title='New')
+        make_comment(cls.kept_article, cls.user, content='New comment')
+
+    def archive(self):
+        call_command('archive', batch_size=1, sleep=0, stdout=StringIO())
+
+    def test_archive_moves_old_rows_in_batches(self):
+        self.archive()
+        self.assertEqual(set(ArchivedComment.objects.values_list('content', flat=True)), {'Old comment', 'Old comment 2'})
+        self.assertEqual(list(ArchivedArticle.objects.values_list('title', flat=True)), ['Old'])
+        self.assertEqual(set(Article.objects.values_list('title', flat=True)), {'Old with new comment', 'New'})
+        self.assertEqual(list(Comment.objects.values_list('content', flat=True)), ['New comment'])
+
+    def test_lists_skip_archive_by_default(self):
+        self.archive()
+        self.assertEqual(len(self.client.get('/api/articles').json()), 2)
+        self.assertEqual(len(self.client.get('/api/comments').json()), 1)
+        recent = (timezone.now() - timedelta(days=30)).isoformat()
+        response = self.client.get('/api/comments', {'created_after': recent})
+        self.assertEqual(len(response.json()), 1)
+
+    def test_date_range_reaches_archive(self):
+        self.archive()
+        before = (timezone.now() - timedelta(days=700)).isoformat()
+        articles = self.client.get('/api/articles', {'created_before': before}).json()
+        self.assertEqual({a['title'] for a in articles}, {'Old', 'Old with new comment'})
+        comments = self.client.get('/api/comments', {'created_before': before}).json()
+        self.assertEqual(
+            {(c['content'], c['article_title']) for c in comments},
+            {('Old comment', 'Old'), ('Old comment 2', 'Old with new comment')}
+        )
+
+    def test_range_uses_archive_contents_not_setting(self):
+        recent = make_article(self.user, title='Recent')
+        Article.objects.filter(pk=recent.pk).update(created_at=timezone.now() - timedelta(days=60))
+        call_command('archive', older_than_days=30, sleep=0, stdout=StringIO())
+        after = (timezone.now() - timedelta(days=90)).isoformat()
+        articles = self.client.get('/api/articles', {'created_after': after}).json()
+        self.assertEqual({a['title'] for a in articles}, {'Recent', 'New'})
+
+    def test_archived_rows_keep_detail_urls(self):
+        self.archive()
+        response = self.client.get(f'/api/articles/{self.old_article.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['title'], 'Old')
+        response = self.client.get(f'/api/comments/{self.old_comment.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['article_title'], 'Old')
+        self.assertEqual(self.client.get('/api/articles/999999').status_code, 404)
+        response = self.client.put(f'/api/articles/{self.old_article.id}',
+            json.dumps({'title': 'Edited'}), content_type='application/json',
+            HTTP_AUTHORIZATION='Bearer test-token-123')
+        self.assertEqual(response.status_code, 404)
+
+    def test_deleting_article_removes_archived_comments(self):
+        self.archive()
+        response = self.client.delete(f'/api/articles/{self.kept_article.id}', HTTP_AUTHORIZATION='Bearer test-token-123')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(ArchivedComment.objects.values_list('content', flat=True)), ['Old comment'])
+
+
+class PopularityTests(TestCase):
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user()
+        cls.first = make_article(cls.user, title='First')
+        cls.second = make_article(cls.user, title='Second')
+
+    def setUp(self):
+        view_counter.drain()
+
+    def view(self, article, times):
+        for _ in range(times):
+            self.client.get(f'/api/articles/{article.id}')
+
+    def test_views_are_counted_in_memory_until_flush(self):
+        self.view(self.first, 3)
+        self.assertEqual(view_counter.pending(), {self.first.id: 3})
+        self.assertFalse(ArticleViewStat.objects.exists())
+
+    def test_flush_upserts_every_window_in_one_statement(self):
+        self.view(self.first, 2)
+        self.view(self.second, 1)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(view_counter.flush(), 3)
+        self.assertEqual(len(queries), 1)
+        self.view(self.first, 2)
+        view_counter.flush()
+        stats = {(s.article_id, s.period): s.views for s in ArticleViewStat.objects.all()}
+        self.assertEqual(stats, {
+            (self.first.id, 'day'): 4, (self.first.id, 'week'): 4,
+            (self.second.id, 'day'): 1, (self.second.id, 'week'): 1,
+        })
+        self.assertEqual(view_counter.pending(), {})
+
+    def test_top_articles_ranked_by_window(self):
+        self.view(self.second, 1)
+        self.view(self.first, 2)
+        view_counter.flush()
+        ArticleViewStat.objects.create(
+            article_id=self.second.id, period='week', period_start=period_start('week') - timedelta(days=7), views=100
+        )
+        response = self.client.get('/api/articles/top', {'window': 'week'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(a['title'], a['views']) for a in response.json()], [('First', 2), ('Second', 1)])
+        response = self.client.get('/api/articles/top', {'window': 'day', 'limit': 1})
+        self.assertEqual([a['title'] for a in response.json()], ['First'])
+
+    @override_settings(POPULARITY_FLUSH_INTERVAL=3600)
+    def test_pending_views_flushed_at_exit(self):
+        counter = ViewCounter()
+        with mock.patch('api.popularity.atexit.register') as register, mock.patch('api.popularity.threading.Thread'):
+            counter.record(self.first.id)
+            counter.record(self.first.id)
+        register.assert_called_once_with(counter._flush_at_exit)
+        counter._flush_at_exit()
+        self.assertEqual(ArticleViewStat.objects.get(article_id=self.first.id, period='day').views, 2)
+        self.assertEqual(counter.pending(), {})
+
+    def test_prune_removes_past_periods(self):
+        today = period_start('day')
+        for period, start in [('day', today - timedelta(days=1)), ('week', period_start('week') - timedelta(days=7)),
+                              ('day', today), ('week', period_start('week'))]:
+            ArticleViewStat.objects.create(article_id=self.first.id, period=period, period_start=start, views=1)
+        self.assertEqual(prune_views(), 2)
+        self.assertEqual(
+            set(ArticleViewStat.objects.values_list('period', 'period_start')),
+            {('day', today), ('week', period_start('week'))},
+        )
+
+    def test_top_articles_rejects_unknown_window(self):
+        response = self.client.get('/api/articles/top', {'window': 'year'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(API_BODY_LIMITS={'/api/comments': 1024, '/api/articles': 4 * 1024 * 1024})
+class PayloadLimitTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user(token='test-token-123')
+        cls.article = make_article(cls.user)
+
+    def post(self, path, payload):
+        return self.client.post(path, json.dumps(payload), content_type='application/json',
+                                HTTP_AUTHORIZATION='Bearer test-token-123')
+
+    def test_oversized_body_rejected_before_read(self):
+        with mock.patch('api.auth.json.loads') as loads:
+            response = self.post('/api/comments', {'article_id': self.article.id, 'content': 'x' * 2000})
+        self.assertEqual(response.status_code, 413)
+        loads.assert_not_called()
+        self.assertFalse(Comment.objects.exists())
+
+    def test_body_within_limit_accepted(self):
+        response = self.post('/api/comments', {'article_id': self.article.id, 'content': 'x' * 500})
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_content_length(self):
+        response = self.client.post('/api/comments', '{}', content_type='application/json', CONTENT_LENGTH='abc')
+        self.assertEqual(response.status_code, 400)
+
+    def test_field_limits(self):
+        response = self.post('/api/articles', {
+            'title': 'Test', 'content': 'x' * (settings.ARTICLE_CONTENT_MAX_LENGTH + 1),
+        })
+        self.assertEqual(response.status_code, 422)
+        response = self.post('/api/articles', {'title': 'x' * 201, 'content': 'Content'})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Article.objects.count(), 1)
+
+    async def call_asgi(self, headers, chunks):
+        received = []
+
+        async def app(scope, receive, send):
+            while True:
+                message = await receive()
+                received.append(message)
+                if not message.get('more_body'):
+                    break
+            await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+            await send({'type': 'http.response.body', 'body': b'ok'})
+
+        messages = iter(chunks)
+        sent = []
+
+        async def receive():
+            return next(messages)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'path': '/api/comments', 'headers': headers}
+        await BodySizeLimitASGIMiddleware(app)(scope, receive, send)
+        return sent[0]['status'], received
+
+    async def test_asgi_guard_rejects_declared_length_without_reading(self):
+        status, received = await self.call_asgi([(b'content-length', b'5000')], [])
+        self.assertEqual(status, 413)
+        self.assertEqual(received, [])
+
+    async def test_asgi_guard_stops_chunked_body_at_limit(self):
+        chunks = [{'type': 'http.request', 'body': b'x' * 600, 'more_body': True} for _ in range(10)]
+        status, received = await self.call_asgi([], chunks)
+        self.assertEqual(status, 413)
+        self.assertEqual(len(received), 1)
+
+    async def test_asgi_guard_passes_small_body(self):
+        status, _ = await self.call_asgi([], [{'type': 'http.request', 'body': b'{}', 'more_body': False}])
+        self.assertEqual(status, 200)
+
+
+@tag('slow')
+class LargeDatasetTests(TestCase):
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user()
+        articles = Article.objects.bulk_create(
+            Article(title=f'Article {i}', content='Content', author=cls.user) for i in range(500)
+        )
+        Comment.objects.bulk_create(
+            Comment(article=article, author=cls.user, content='Comment') for article in articles for _ in range(10)
+        )
+
+    def test_lists_use_constant_number_of_queries(self):
+        with CaptureQueriesContext(connections['replica']) as queries:
+            self.assertEqual(len(self.client.get('/api/articles').json()), 500)
+            self.assertEqual(len(self.client.get('/api/comments').json()), 5000)
+        self.assertLessEqual(len(queries), 2)
+
+    def test_archive_moves_large_table_in_batches(self):
+        old = timezone.now() - timedelta(days=settings.ARCHIVE_AFTER_DAYS + 1)
+        Article.objects.update(created_at=old)
+        Comment.objects.update(created_at=old)
+        call_command('archive', batch_size=1000, sleep=0, stdout=StringIO())
+        self.assertEqual((ArchivedArticle.objects.count(), ArchivedComment.objects.count()), (500, 5000))
+        self.assertFalse(Article.objects.exists())
+        self.assertFalse(Comment.objects.exists())
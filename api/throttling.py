@@ -0,0 +1,176 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from ninja.throttling import BaseThrottle, SimpleRateThrottle
+import logging
+
+logger = logging.getLogger('api')
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def get_throttle_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_throttle_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+class MemoryBucketBackend:
+    def __init__(self, max_size=None):
+        self.max_size = max_size or getattr(settings, 'THROTTLE_MAX_BUCKETS', 100000)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, refill_rate, now):
+        with self._lock:
+            # pop + вставка держит словарь в порядке последнего обращения
+            tokens, updated_at, _ = self._buckets.pop(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated_at) * refill_rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / refill_rate)
+            if len(self._buckets) > self.max_size:
+                self._evict(now)
+            if allowed:
+                return True, 0.0
+            return False, (1 - tokens) / refill_rate
+
+    def _evict(self, now):
+        # Заполненное ведро ничем не отличается от отсутствующего
+        for key in [key for key, (_, _, full_at) in self._buckets.items() if full_at <= now]:
+            del self._buckets[key]
+        # Остальные вытесняются по давности обращения с запасом, чтобы не
+        # пересматривать весь словарь на каждом новом ключе
+        if len(self._buckets) > self.max_size:
+            excess = len(self._buckets) - self.max_size * 9 // 10
+            for key in list(self._buckets)[:excess]:
+                del self._buckets[key]
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBucketBackend:
+    # Общее хранилище для нескольких воркеров (Redis/Memcached через CACHES).
+    # Чтение и запись не атомарны, поэтому под конкуренцией лимит мягкий.
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def take(self, key, capacity, refill_rate, now):
+        tokens, updated_at = self.cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated_at) * refill_rate)
+        timeout = int(capacity / refill_rate) + 1
+        if tokens >= 1:
+            self.cache.set(key, (tokens - 1, now), timeout)
+            return True, 0.0
+        self.cache.set(key, (tokens, now), timeout)
+        return False, (1 - tokens) / refill_rate
+
+    def reset(self):
+        self.cache.clear()
+
+
+memory_backend = MemoryBucketBackend()
+
+
+def get_backend():
+    alias = getattr(settings, 'THROTTLE_CACHE_ALIAS', None)
+    if alias:
+        return CacheBucketBackend(alias)
+    return memory_backend
+
+
+class TokenBucketThrottle(BaseThrottle):
+    key_prefix = 'bucket'
+    timer = time.time
+    _PERIODS = SimpleRateThrottle._PERIODS
+    parse_rate = SimpleRateThrottle.parse_rate
+
+    def __init__(self, scope, rate=None, burst=None, write_only=False, backend=None):
+        self.scope = scope
+        self._rate = rate
+        self.burst = burst
+        self.write_only = write_only
+        self.backend = backend
+        self._wait = threading.local()
+
+    # Лимиты читаются из настроек при каждом запросе: throttle на роутерах
+    # создаются при импорте, а override_settings должен на них влиять
+    @property
+    def rate(self):
+        return self._rate or settings.THROTTLE_RATES[self.scope]
+
+    @property
+    def capacity(self):
+        return self.burst or self.parse_rate(self.rate)[0]
+
+    @property
+    def refill_rate(self):
+        num_requests, duration = self.parse_rate(self.rate)
+        return num_requests / duration
+
+    def get_cache_key(self, request):
+        return f'{self.key_prefix}_{self.scope}_{self.get_ident(request)}'
+
+    def allow_request(self, request):
+        if self.write_only and request.method in SAFE_METHODS:
+            return True
+
+        key = self.get_cache_key(request)
+        if key is None:
+            return True
+
+        backend = self.backend or get_backend()
+        allowed, wait = backend.take(key, self.capacity, self.refill_rate, self.timer())
+        self._wait.value = wait
+        if allowed:
+            count(f'{self.scope}.allowed')
+        else:
+            count(f'{self.scope}.throttled')
+            logger.warning(f'Превышен лимит запросов {self.scope}: {key}')
+        return allowed
+
+    def wait(self):
+        return getattr(self._wait, 'value', None)
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    key_prefix = 'bucket_ip'
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    key_prefix = 'bucket_user'
+
+    def get_ident(self, request):
+        auth = getattr(request, 'auth', None)
+        if auth is not None:
+            return f'user:{auth.pk}'
+
+        token = request.headers.get('Authorization')
+        if token:
+            return 'token:' + hashlib.sha256(token.encode()).hexdigest()
+
+        return super().get_ident(request)
@@ -1,19 +1,36 @@
+from datetime import datetime
+from typing import Optional
 from ninja import Router
 from ninja.errors import HttpError
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.db import transaction
 from django.shortcuts import get_object_or_404
-from .models import User, Article, Comment, Category
+from .models import User, Article, Comment, Category, ArchivedArticle, ArchivedComment, ArticleViewStat
 from .schemas import (
     UserRegisterSchema, UserLoginSchema, TokenResponseSchema,
     ArticleCreateSchema, ArticleUpdateSchema, ArticleSchema,
     CommentCreateSchema, CommentUpdateSchema, CommentSchema,
-    CategorySchema
+    CategorySchema, TopArticleSchema
 )
-from .auth import get_user_from_token
+from .archive import (
+    date_filters, reaches_archive, attach_articles, get_article_or_archived, get_comment_or_archived
+)
+from .auth import token_auth
+from .db_router import read_from_replica
+from .outbox import enqueue
 import logging
 
 logger = logging.getLogger('api')
 
+
+def publish_comment(event_type, article_id, data):
+    # Брокер SSE загружается при первом событии, а не при загрузке URLconf
+    from .events import comment_events
+
+    transaction.on_commit(lambda: comment_events.publish(event_type, article_id, data))
+
+
 auth_router = Router()
 articles_router = Router()
 comments_router = Router()
@@ -48,8 +65,13 @@ def login(request, data: UserLoginSchema):
 
 
 @articles_router.get('', response=list[ArticleSchema])
-def list_articles(request):
-    articles = Article.objects.select_related('author', 'category').all()
+@read_from_replica
+def list_articles(request, created_after: Optional[datetime] = None, created_before: Optional[datetime] = None):
+    filters = date_filters(created_after, created_before)
+    articles = list(Article.objects.select_related('author', 'category').filter(**filters))
+    if reaches_archive(ArchivedArticle, created_after, created_before):
+        articles += ArchivedArticle.objects.select_related('author', 'category').filter(**filters)
+        articles.sort(key=lambda a: a.created_at, reverse=True)
     logger.info('Получен список статей')
     return [
         ArticleSchema(
@@ -65,13 +87,9 @@ def list_articles(request):
     ]
 
 
-@articles_router.post('', response=ArticleSchema)
+@articles_router.post('', response=ArticleSchema, auth=token_auth)
 def create_article(request, data: ArticleCreateSchema):
-    user = get_user_from_token(request)
-    if not user:
-        logger.warning('Попытка создания статьи без авторизации')
-        raise HttpError(401, 'Требуется авторизация')
-    
+    user = request.auth
     category = None
     if data.category_id:
         try:
@@ -80,12 +98,14 @@ def create_article(request, data: ArticleCreateSchema):
             logger.warning(f'Категория не найдена: {data.category_id}')
             raise HttpError(400, 'Категория не найдена')
     
-    article = Article.objects.create(
-        title=data.title,
-        content=data.content,
-        author=user,
-        category=category
-    )
+    with transaction.atomic():
+        article = Article.objects.create(
+            title=data.title,
+            content=data.content,
+            author=user,
+            category=category
+        )
+        enqueue('article_saved', article_id=article.id, user_id=user.id, created=True)
     logger.info(f'Статья создана: {article.id} пользователем {user.username}')
     return ArticleSchema(
         id=article.id,
@@ -99,9 +119,34 @@ def create_article(request, data: ArticleCreateSchema):
     )
 
 
+@articles_router.get('/top', response=list[TopArticleSchema])
+@read_from_replica
+def top_articles(request, window: str = 'day', limit: int = 10):
+    if window not in settings.POPULARITY_WINDOWS:
+        raise HttpError(400, f'Окно должно быть одним из: {", ".join(settings.POPULARITY_WINDOWS)}')
+    from .popularity import top_article_ids
+
+    limit = min(max(limit, 1), 100)
+    top = top_article_ids(window, limit)
+    articles = Article.objects.select_related('author').in_bulk([article_id for article_id, _ in top])
+    logger.info(f'Получен рейтинг статей за {window}')
+    return [
+        TopArticleSchema(
+            id=article_id,
+            title=articles[article_id].title,
+            author_username=articles[article_id].author.username,
+            views=views
+        ) for article_id, views in top if article_id in articles
+    ]
+
+
 @articles_router.get('/{article_id}', response=ArticleSchema)
+@read_from_replica
 def get_article(request, article_id: int):
-    article = get_object_or_404(Article, id=article_id)
+    from .popularity import view_counter
+
+    article = get_article_or_archived(article_id)
+    view_counter.record(article.id)
     logger.info(f'Получена статья: {article_id}')
     return ArticleSchema(
         id=article.id,
@@ -115,13 +160,16 @@ def get_article(request, article_id: int):
     )
 
 
-@articles_router.put('/{article_id}', response=ArticleSchema)
+@articles_router.get('/{article_id}/comments/stream')
+async def stream_article_comments(request, article_id: int):
+    from .events import stream_response
+
+    return stream_response(request, article_id)
+
+
+@articles_router.put('/{article_id}', response=ArticleSchema, auth=token_auth)
 def update_article(request, article_id: int, data: ArticleUpdateSchema):
-    user = get_user_from_token(request)
-    if not user:
-        logger.warning('Попытка обновления статьи без авторизации')
-        raise HttpError(401, 'Требуется авторизация')
-    
+    user = request.auth
     article = get_object_or_404(Article, id=article_id)
     if article.author != user:
         logger.warning(f'Попытка обновления чужой статьи: {article_id} пользователем {user.username}')
@@ -138,7 +186,9 @@ def update_article(request, article_id: int, data: ArticleUpdateSchema):
             logger.warning(f'Категория не найдена: {data.category_id}')
             raise HttpError(400, 'Категория не найдена')
     
-    article.save()
+    with transaction.atomic():
+        article.save()
+        enqueue('article_saved', article_id=article.id, user_id=user.id, created=False)
     logger.info(f'Статья обновлена: {article_id} пользователем {user.username}')
     return ArticleSchema(
         id=article.id,
@@ -152,26 +202,31 @@ def update_article(request, article_id: int, data: ArticleUpdateSchema):
     )
 
 
-@articles_router.delete('/{article_id}')
+@articles_router.delete('/{article_id}', auth=token_auth)
 def delete_article(request, article_id: int):
-    user = get_user_from_token(request)
-    if not user:
-        logger.warning('Попытка удаления статьи без авторизации')
-        raise HttpError(401, 'Требуется авторизация')
-    
+    user = request.auth
     article = get_object_or_404(Article, id=article_id)
     if article.author != user:
         logger.warning(f'Попытка удаления чужой статьи: {article_id} пользователем {user.username}')
         raise HttpError(403, 'Вы можете удалять только свои статьи')
     
-    article.delete()
+    with transaction.atomic():
+        article.delete()
+        ArchivedComment.objects.filter(article_id=article_id).delete()
+        ArticleViewStat.objects.filter(article_id=article_id).delete()
+        enqueue('article_deleted', article_id=article_id, user_id=user.id)
     logger.info(f'Статья удалена: {article_id} пользователем {user.username}')
     return {'success': True}
 
 
 @comments_router.get('', response=list[CommentSchema])
-def list_comments(request):
-    comments = Comment.objects.select_related('article', 'author').all()
+@read_from_replica
+def list_comments(request, created_after: Optional[datetime] = None, created_before: Optional[datetime] = None):
+    filters = date_filters(created_after, created_before)
+    comments = list(Comment.objects.select_related('article', 'author').filter(**filters))
+    if reaches_archive(ArchivedComment, created_after, created_before):
+        comments += attach_articles(list(ArchivedComment.objects.select_related('author').filter(**filters)))
+        comments.sort(key=lambda c: c.created_at, reverse=True)
     logger.info('Получен список комментариев')
     return [
         CommentSchema(
@@ -187,21 +242,26 @@ def list_comments(request):
     ]
 
 
-@comments_router.post('', response=CommentSchema)
+@comments_router.get('/stream')
+async def stream_comments(request):
+    from .events import stream_response
+
+    return stream_response(request)
+
+
+@comments_router.post('', response=CommentSchema, auth=token_auth)
 def create_comment(request, data: CommentCreateSchema):
-    user = get_user_from_token(request)
-    if not user:
-        logger.warning('Попытка создания комментария без авторизации')
-        raise HttpError(401, 'Требуется авторизация')
-    
+    user = request.auth
     article = get_object_or_404(Article, id=data.article_id)
-    comment = Comment.objects.create(
-        article=article,
-        author=user,
-        content=data.content
-    )
+    with transaction.atomic():
+        comment = Comment.objects.create(
+            article=article,
+            author=user,
+            content=data.content
+        )
+        enqueue('comment_saved', comment_id=comment.id, article_id=article.id, user_id=user.id, created=True)
     logger.info(f'Комментарий создан: {comment.id} пользователем {user.username}')
-    return CommentSchema(
+    result = CommentSchema(
         id=comment.id,
         article_id=comment.article.id,
         article_title=comment.article.title,
@@ -211,11 +271,14 @@ def create_comment(request, data: CommentCreateSchema):
         created_at=comment.created_at,
         updated_at=comment.updated_at
     )
+    publish_comment('created', result.article_id, result)
+    return result
 
 
 @comments_router.get('/{comment_id}', response=CommentSchema)
+@read_from_replica
 def get_comment(request, comment_id: int):
-    comment = get_object_or_404(Comment, id=comment_id)
+    comment = get_comment_or_archived(comment_id)
     logger.info(f'Получен комментарий: {comment_id}')
     return CommentSchema(
         id=comment.id,
@@ -229,22 +292,20 @@ def get_comment(request, comment_id: int):
     )
 
 
-@comments_router.put('/{comment_id}', response=CommentSchema)
+@comments_router.put('/{comment_id}', response=CommentSchema, auth=token_auth)
 def update_comment(request, comment_id: int, data: CommentUpdateSchema):
-    user = get_user_from_token(request)
-    if not user:
-        logger.warning('Попытка обновления комментария без авторизации')
-        raise HttpError(401, 'Требуется авторизация')
-    
+    user = request.auth
     comment = get_object_or_404(Comment, id=comment_id)
     if comment.author != user:
         logger.warning(f'Попытка обновления чужого комментария: {comment_id} пользователем {user.username}')
         raise HttpError(403, 'Вы можете редактировать только свои комментарии')
     
     comment.content = data.content
-    comment.save()
+    with transaction.atomic():
+        comment.save()
+        enqueue('comment_saved', comment_id=comment.id, article_id=comment.article_id, user_id=user.id, created=False)
     logger.info(f'Комментарий обновлен: {comment_id} пользователем {user.username}')
-    return CommentSchema(
+    result = CommentSchema(
         id=comment.id,
         article_id=comment.article.id,
         article_title=comment.article.title,
@@ -254,21 +315,22 @@ def update_comment(request, comment_id: int, data: CommentUpdateSchema):
         created_at=comment.created_at,
         updated_at=comment.updated_at
     )
+    publish_comment('updated', result.article_id, result)
+    return result
 
 
-@comments_router.delete('/{comment_id}')
+@comments_router.delete('/{comment_id}', auth=token_auth)
 def delete_comment(request, comment_id: int):
-    user = get_user_from_token(request)
-    if not user:
-        logger.warning('Попытка удаления комментария без авторизации')
-        raise HttpError(401, 'Требуется авторизация')
-    
+    user = request.auth
     comment = get_object_or_404(Comment, id=comment_id)
     if comment.author != user:
         logger.warning(f'Попытка удаления чужого комментария: {comment_id} пользователем {user.username}')
         raise HttpError(403, 'Вы можете удалять только свои комментарии')
     
-    comment.delete()
+    with transaction.atomic():
+        comment.delete()
+        enqueue('comment_deleted', comment_id=comment_id, article_id=comment.article_id, user_id=user.id)
     logger.info(f'Комментарий удален: {comment_id} пользователем {user.username}')
+    publish_comment('deleted', comment.article_id, {'id': comment_id, 'article_id': comment.article_id})
     return {'success': True}
 
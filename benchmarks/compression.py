@@ -0,0 +1,103 @@
+"""Размер ответа и CPU на запрос для разных кодировок.
+
+    python benchmarks/compression.py
+    python benchmarks/compression.py --articles 500 --content-size 4000
+
+Заполняет тестовую базу SQLite в памяти и запрашивает GET /api/articles
+и GET /api/comments с разными Accept-Encoding / Accept.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blog.settings_api')
+os.environ['USE_SQLITE'] = 'True'
+
+WORDS = 'статья комментарий блог текст django api пример данные сервер клиент запрос ответ'.split()
+
+VARIANTS = [
+    ('json', {}),
+    ('json+gzip', {'HTTP_ACCEPT_ENCODING': 'gzip'}),
+    ('json+br', {'HTTP_ACCEPT_ENCODING': 'br'}),
+    ('json+zstd', {'HTTP_ACCEPT_ENCODING': 'zstd'}),
+    ('msgpack', {'HTTP_ACCEPT': 'application/msgpack'}),
+    ('msgpack+zstd', {'HTTP_ACCEPT': 'application/msgpack', 'HTTP_ACCEPT_ENCODING': 'zstd'}),
+]
+
+
+def populate(articles, comments_per_article, content_size):
+    from api.models import Article, Comment, User
+
+    rng = random.Random(0)
+
+    def text(size):
+        words = []
+        while sum(len(w) + 1 for w in words) < size:
+            words.append(rng.choice(WORDS) + str(rng.randint(0, 999)))
+        return ' '.join(words)[:size]
+
+    user = User.objects.create_user(username='bench', password='bench')
+    created = Article.objects.bulk_create(
+        Article(title=f'Статья {i}', content=text(content_size), author=user) for i in range(articles)
+    )
+    Comment.objects.bulk_create(
+        Comment(article=article, author=user, content=text(200))
+        for article in created for _ in range(comments_per_article)
+    )
+
+
+def measure(client, path, headers, requests):
+    response = client.get(path, **headers)
+    size = len(response.content)
+    encoding = response.get('Content-Encoding', '-')
+    start = time.process_time()
+    for _ in range(requests):
+        client.get(path, **headers)
+    return size, encoding, (time.process_time() - start) / requests * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--articles', type=int, default=200)
+    parser.add_argument('--comments', type=int, default=5, help='комментариев на статью')
+    parser.add_argument('--content-size', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=20)
+    args = parser.parse_args()
+
+    import django
+    django.setup()
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+
+    from api.compression import COMPRESSORS
+    from api.renderers import MSGPACK_AVAILABLE
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    populate(args.articles, args.comments, args.content_size)
+
+    client = Client()
+    print(f'{"path":<16} {"variant":<14} {"encoding":<9} {"bytes":>10} {"ratio":>6} {"cpu ms":>8}')
+    for path in ('/api/articles', '/api/comments'):
+        baseline = None
+        for name, headers in VARIANTS:
+            encoding = headers.get('HTTP_ACCEPT_ENCODING')
+            if encoding and encoding not in COMPRESSORS or 'msgpack' in name and not MSGPACK_AVAILABLE:
+                print(f'{path:<16} {name:<14} не установлен')
+                continue
+            size, used, cpu = measure(client, path, headers, args.requests)
+            baseline = baseline or size
+            print(f'{path:<16} {name:<14} {used:<9} {size:>10} {size / baseline:>6.2f} {cpu:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
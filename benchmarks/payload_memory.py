@@ -0,0 +1,118 @@
+"""Пиковая память на запрос POST /api/articles в зависимости от размера тела.
+
+    python benchmarks/payload_memory.py
+    python benchmarks/payload_memory.py --sizes 10000 100000 400000 --oversized 8000000
+
+Запрос идет через blog.asgi.application (как под uvicorn): тело приходит
+кусками по 64 КиБ через receive. Тело собирается заранее, а tracemalloc
+измеряет только обработку: обертку лимитов, чтение тела, разбор JSON,
+валидацию и запись в тестовую базу SQLite в памяти.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tracemalloc
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blog.settings_api')
+os.environ['USE_SQLITE'] = 'True'
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+def build_request(content_size, token):
+    body = json.dumps({'title': 'Статья', 'content': 'ж' * content_size}, ensure_ascii=False).encode()
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'POST',
+        'scheme': 'http',
+        'path': '/api/articles',
+        'raw_path': b'/api/articles',
+        'query_string': b'',
+        'root_path': '',
+        'headers': [
+            (b'host', b'testserver'),
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'authorization', f'Bearer {token}'.encode()),
+        ],
+        'client': ('127.0.0.1', 50000),
+        'server': ('testserver', 80),
+    }
+    chunks = [body[i:i + CHUNK_SIZE] for i in range(0, len(body), CHUNK_SIZE)]
+    messages = [
+        {'type': 'http.request', 'body': chunk, 'more_body': i < len(chunks) - 1}
+        for i, chunk in enumerate(chunks)
+    ]
+    return scope, messages, len(body)
+
+
+async def call(application, scope, messages):
+    status = None
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await application(scope, receive, send)
+    return status
+
+
+def measure(application, scope, messages):
+    tracemalloc.start()
+    status = asyncio.run(call(application, scope, messages))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return status, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 400000],
+                        help='длина content в символах')
+    parser.add_argument('--oversized', type=int, default=3000000,
+                        help='длина content для запроса больше лимита тела')
+    args = parser.parse_args()
+
+    import django
+    django.setup()
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    from api.models import User
+    from api.throttling import memory_backend
+    from blog.asgi import application
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    User.objects.create_user(username='bench', password='bench', token='bench-token')
+
+    # Прогрев: первый запрос импортирует модули и строит схемы
+    measure(application, *build_request(10, 'bench-token')[:2])
+
+    print(f'{"content":>10} {"body bytes":>12} {"status":>7} {"peak KiB":>10} {"peak/body":>10}')
+    for size in args.sizes + [args.oversized]:
+        memory_backend.reset()
+        scope, messages, body_size = build_request(size, 'bench-token')
+        status, peak = measure(application, scope, messages)
+        print(f'{size:>10} {body_size:>12} {status:>7} {peak / 1024:>10.0f} {peak / body_size:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
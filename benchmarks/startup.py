@@ -0,0 +1,83 @@
+"""Холодный старт и накладные расходы на запрос для профилей настроек.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --requests 2000 blog.settings blog.settings_api
+
+Для каждого профиля в отдельном процессе измеряется время импорта
+django.setup() + URLconf, затем на тестовой базе SQLite в памяти
+гоняется GET /api/articles через полный стек middleware.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+CHILD = r'''
+import json, os, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.conf import settings
+from django.urls import get_resolver
+get_resolver().url_patterns
+startup = time.perf_counter() - start
+modules = len(sys.modules)
+
+import logging
+logging.disable(logging.CRITICAL)
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment
+setup_test_environment()
+connection.creation.create_test_db(verbosity=0)
+
+client = Client()
+n = int(sys.argv[1])
+for _ in range(50):
+    client.get('/api/articles')
+start = time.perf_counter()
+for _ in range(n):
+    client.get('/api/articles')
+per_request = (time.perf_counter() - start) / n
+print(json.dumps({
+    'startup_ms': startup * 1000,
+    'modules': modules,
+    'apps': len(settings.INSTALLED_APPS),
+    'middleware': len(settings.MIDDLEWARE),
+    'request_us': per_request * 1e6,
+}))
+'''
+
+
+def run(settings_module, requests):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module, USE_SQLITE='True')
+    output = subprocess.check_output(
+        [sys.executable, '-c', CHILD, str(requests)], cwd=BASE_DIR, env=env
+    )
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('settings', nargs='*', default=['blog.settings', 'blog.settings_api'])
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f'{"settings":<20} {"startup ms":>11} {"modules":>8} {"apps":>5} {"mw":>3} {"req us":>8}')
+    for settings_module in args.settings:
+        results = [run(settings_module, args.requests) for _ in range(args.repeat)]
+        best = min(results, key=lambda r: r['startup_ms'])
+        request_us = min(r['request_us'] for r in results)
+        print(
+            f'{settings_module:<20} {best["startup_ms"]:>11.1f} {best["modules"]:>8} '
+            f'{best["apps"]:>5} {best["middleware"]:>3} {request_us:>8.1f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
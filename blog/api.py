@@ -0,0 +1,58 @@
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from ninja import NinjaAPI
+from ninja.errors import AuthenticationError, Throttled
+from api.views import auth_router, articles_router, comments_router
+from api.auth import JSONBodyParser
+from api.renderers import MessagePackRenderer, UTF8JSONRenderer, accepts_msgpack
+from api.throttling import IPTokenBucketThrottle, UserTokenBucketThrottle
+import logging
+import math
+
+logger = logging.getLogger('api')
+
+
+class BlogAPI(NinjaAPI):
+    # JSON по умолчанию, MessagePack для клиентов с Accept: application/msgpack
+    msgpack_renderer = MessagePackRenderer()
+
+    def create_response(self, request, data, *, status=None, temporal_response=None):
+        if accepts_msgpack(request):
+            if temporal_response:
+                status = temporal_response.status_code
+            response = temporal_response or HttpResponse(status=status)
+            response.content = self.msgpack_renderer.render(request, data, response_status=status)
+            response['Content-Type'] = self.msgpack_renderer.media_type
+        else:
+            response = super().create_response(
+                request, data, status=status, temporal_response=temporal_response
+            )
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+
+api = BlogAPI(
+    title='Blog API', version='1.0.0', parser=JSONBodyParser(), renderer=UTF8JSONRenderer()
+)
+
+
+@api.exception_handler(AuthenticationError)
+def authentication_error(request, exc):
+    logger.warning(f'Попытка {request.method} {request.path} без авторизации')
+    return api.create_response(request, {'detail': 'Требуется авторизация'}, status=401)
+
+
+@api.exception_handler(Throttled)
+def throttled(request, exc):
+    response = api.create_response(request, {'detail': str(exc)}, status=429)
+    if exc.wait:
+        response['Retry-After'] = str(math.ceil(exc.wait))
+    return response
+
+
+# IP-лимит записи списывает TokenAuth, здесь остается лимит на пользователя
+write_throttle = UserTokenBucketThrottle('write', write_only=True)
+
+api.add_router('/auth', auth_router, throttle=IPTokenBucketThrottle('auth'))
+api.add_router('/articles', articles_router, throttle=write_throttle)
+api.add_router('/comments', comments_router, throttle=write_throttle)
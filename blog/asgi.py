@@ -0,0 +1,19 @@
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blog.settings')
+
+application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.DEBUG and 'django.contrib.staticfiles' in settings.INSTALLED_APPS:
+    # Статика админки в разработке, как у runserver
+    from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+
+    application = ASGIStaticFilesHandler(application)
+
+from api.middleware import BodySizeLimitASGIMiddleware  # noqa: E402
+
+application = BodySizeLimitASGIMiddleware(application)
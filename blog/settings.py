@@ -26,12 +26,16 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.BodySizeLimitMiddleware',
+    'api.compression.CompressionMiddleware',
+    'api.middleware.ConcurrencyLimitMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.ReplicaPinMiddleware',
 ]
 
 ROOT_URLCONF = 'blog.urls'
@@ -54,7 +58,23 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'blog.wsgi.application'
 
-if os.getenv('USE_SQLITE', 'False') == 'True' or 'test' in sys.argv:
+TESTING = 'test' in sys.argv
+
+if TESTING:
+    # replica в тестах — зеркало default: чтения через роутер реально идут
+    # по второму соединению к той же базе
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+        },
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+            'TEST': {'MIRROR': 'default'},
+        },
+    }
+elif os.getenv('USE_SQLITE', 'False') == 'True':
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
@@ -73,6 +93,21 @@ else:
         }
     }
 
+if not TESTING and os.getenv('SQLITE_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / os.getenv('SQLITE_REPLICA_NAME'),
+    }
+elif not TESTING and os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('DB_REPLICA_HOST'),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+    }
+
+DATABASE_ROUTERS = ['api.db_router.ReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '5'))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -98,6 +133,53 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'api.User'
 
+TASKS_MODE = os.getenv('TASKS_MODE', 'thread')
+TASK_WORKERS = int(os.getenv('TASK_WORKERS', '4'))
+TASK_MAX_ATTEMPTS = int(os.getenv('TASK_MAX_ATTEMPTS', '5'))
+TASK_RETRY_DELAY = int(os.getenv('TASK_RETRY_DELAY', '10'))
+TASK_LEASE_SECONDS = int(os.getenv('TASK_LEASE_SECONDS', '300'))
+
+SSE_BUFFER_SIZE = int(os.getenv('SSE_BUFFER_SIZE', '1000'))
+SSE_QUEUE_SIZE = int(os.getenv('SSE_QUEUE_SIZE', '100'))
+SSE_HEARTBEAT = float(os.getenv('SSE_HEARTBEAT', '15'))
+SSE_RETRY_MS = int(os.getenv('SSE_RETRY_MS', '3000'))
+
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+COMPRESSION_ENCODINGS = ['br', 'zstd', 'gzip']
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 4
+COMPRESSION_ZSTD_LEVEL = 3
+
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '365'))
+
+POPULARITY_WINDOWS = os.getenv('POPULARITY_WINDOWS', 'day,week').split(',')
+POPULARITY_FLUSH_INTERVAL = float(os.getenv('POPULARITY_FLUSH_INTERVAL', '10'))
+
+ARTICLE_CONTENT_MAX_LENGTH = int(os.getenv('ARTICLE_CONTENT_MAX_LENGTH', '500000'))
+COMMENT_CONTENT_MAX_LENGTH = int(os.getenv('COMMENT_CONTENT_MAX_LENGTH', '10000'))
+API_BODY_LIMITS = {
+    '/api/auth/': 16 * 1024,
+    '/api/comments': 128 * 1024,
+    '/api/articles': int(os.getenv('ARTICLE_BODY_MAX_SIZE', str(4 * 1024 * 1024))),
+    '/api/': 64 * 1024,
+}
+DATA_UPLOAD_MAX_MEMORY_SIZE = max(API_BODY_LIMITS.values())
+
+AUTH_BODY_TOKEN_FALLBACK = os.getenv('AUTH_BODY_TOKEN_FALLBACK', 'False') == 'True'
+
+THROTTLE_RATES = {
+    'auth': os.getenv('THROTTLE_AUTH_RATE', '10/min'),
+    'write': os.getenv('THROTTLE_WRITE_RATE', '60/min'),
+}
+THROTTLE_CACHE_ALIAS = os.getenv('THROTTLE_CACHE_ALIAS') or None
+THROTTLE_MAX_BUCKETS = int(os.getenv('THROTTLE_MAX_BUCKETS', '100000'))
+# Число доверенных прокси перед приложением. При 0 IP клиента берется из
+# REMOTE_ADDR, а X-Forwarded-For, который клиент может подделать, игнорируется
+NINJA_NUM_PROXIES = int(os.getenv('NUM_PROXIES', '0'))
+
+MAX_CONCURRENT_REQUESTS = int(os.getenv('MAX_CONCURRENT_REQUESTS', '50'))
+CONCURRENCY_QUEUE_TIMEOUT = float(os.getenv('CONCURRENCY_QUEUE_TIMEOUT', '0.5'))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -134,3 +216,17 @@ LOGGING = {
     },
 }
 
+
+if TESTING:
+    # Быстрый хешер паролей и логи без файла: create_user и запросы в тестах
+    # не тратят время на PBKDF2 и запись в blog.log. Счетчики просмотров
+    # сбрасываются в тестах явно, без фонового потока
+    PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+    POPULARITY_FLUSH_INTERVAL = 0
+    # Все тесты ходят с 127.0.0.1 и делят одно ведро: реальные лимиты
+    # включаются только в ThrottlingTests через override_settings
+    THROTTLE_RATES = {'auth': '100000/min', 'write': '100000/min'}
+    LOGGING['handlers'] = {'console': LOGGING['handlers']['console']}
+    for logger_config in LOGGING['loggers'].values():
+        logger_config['handlers'] = ['console']
+        logger_config['level'] = 'ERROR'
@@ -0,0 +1,30 @@
+# Профиль для воркеров, которые обслуживают только /api/: без админки,
+# сессий, сообщений и статики. Авторизация идет по токену (api/auth.py),
+# поэтому middleware сессий, CSRF и auth на запросах к API не нужны.
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'api',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'api.middleware.BodySizeLimitMiddleware',
+    'api.compression.CompressionMiddleware',
+    'api.middleware.ConcurrencyLimitMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'api.middleware.ReplicaPinMiddleware',
+]
+
+ROOT_URLCONF = 'blog.urls_api'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': False,
+        'OPTIONS': {},
+    },
+]